@@ -0,0 +1,59 @@
+import numpy as np
+
+THRESHOLD = .2 # normalized heatmap value
+
+def normalize(frames, z_min, z_max):
+	# frames: uint8 (n, height, width), z_min/z_max: one value or one per frame
+	# touches show up as low raw values, so invert while scaling to 0..1
+	z_min = np.asarray(z_min, np.float32).reshape(-1, 1, 1)
+	z_max = np.asarray(z_max, np.float32).reshape(-1, 1, 1)
+	z = (z_max - frames) / np.maximum(z_max - z_min, 1)
+	return np.clip(z, 0, 1, out=z)
+
+def label(mask):
+	# 4-connected components of every frame in the stack
+	# returns the flat indices of the set pixels, and for each of them a label that is unique across the stack
+	n, h, w = mask.shape
+	idx = np.flatnonzero(mask)
+	labels = np.arange(len(idx), dtype=np.int32)
+	if not len(idx): return idx, labels
+	# horizontal and vertical runs of set pixels, the vertical ones via the column-major order
+	hstarts = np.flatnonzero((np.diff(idx, prepend=-2) != 1) | (idx % w == 0))
+	cidx = np.flatnonzero(mask.transpose(0, 2, 1))
+	vstarts = np.flatnonzero((np.diff(cidx, prepend=-2) != 1) | (cidx % h == 0))
+	f, x, y = np.unravel_index(cidx, (n, w, h))
+	pos = np.empty(mask.size, np.int32)
+	pos[idx] = labels
+	vpos = pos[(f * h + y) * w + x]
+	hlen = np.diff(hstarts, append=len(idx))
+	vlen = np.diff(vstarts, append=len(idx))
+	while True:
+		prev = labels
+		# spread the smallest label over each run, alternating directions
+		labels = np.repeat(np.minimum.reduceat(labels, hstarts), hlen)
+		labels[vpos] = np.repeat(np.minimum.reduceat(labels[vpos], vstarts), vlen)
+		# every label is the position of a pixel in the same component, follow those links to the root
+		while True:
+			j = labels[labels]
+			if np.array_equal(j, labels): break
+			labels = j
+		if np.array_equal(labels, prev): return idx, labels
+
+def find_contacts(frames, z_min, z_max, threshold=THRESHOLD):
+	# returns (frame index, x, y, size, peak) arrays with one entry per contact
+	# x/y are the weighted centroid in col/row units, size is the number of pixels
+	frames = np.asarray(frames, np.uint8)
+	z = normalize(frames, z_min, z_max)
+	idx, labels = label(z > threshold)
+	ids, inv = np.unique(labels, return_inverse=True)
+	n = len(ids)
+	_, y, x = np.unravel_index(idx, frames.shape)
+	w = z.ravel()[idx]
+	wsum = np.bincount(inv, w, n)
+	cx = np.bincount(inv, w * x, n) / wsum
+	cy = np.bincount(inv, w * y, n) / wsum
+	size = np.bincount(inv, minlength=n)
+	order = np.argsort(inv, kind='stable')
+	peak = np.maximum.reduceat(w[order], np.searchsorted(inv[order], np.arange(n))) if n else w[:0]
+	frame = idx[ids] // (frames.shape[1] * frames.shape[2])
+	return frame, cx, cy, size, peak
@@ -0,0 +1,221 @@
+# random access into gzip files, based on zlib's examples/zran.c
+# python's zlib module doesn't expose Z_BLOCK or inflatePrime(), so this talks to libz directly
+
+import bisect, ctypes, ctypes.util, io, os, struct, tempfile, zlib
+
+SPAN = 1 << 20 # uncompressed bytes between access points
+WINSIZE = 32768
+CHUNK = 1 << 16
+
+Z_OK, Z_STREAM_END, Z_NEED_DICT = 0, 1, 2
+Z_NO_FLUSH, Z_BLOCK = 0, 5
+
+class ZStream(ctypes.Structure):
+	_fields_ = [
+	('next_in', ctypes.c_void_p),
+	('avail_in', ctypes.c_uint),
+	('total_in', ctypes.c_ulong),
+	('next_out', ctypes.c_void_p),
+	('avail_out', ctypes.c_uint),
+	('total_out', ctypes.c_ulong),
+	('msg', ctypes.c_char_p),
+	('state', ctypes.c_void_p),
+	('zalloc', ctypes.c_void_p),
+	('zfree', ctypes.c_void_p),
+	('opaque', ctypes.c_void_p),
+	('data_type', ctypes.c_int),
+	('adler', ctypes.c_ulong),
+	('reserved', ctypes.c_ulong),
+	]
+
+libz = ctypes.CDLL(ctypes.util.find_library('z') or 'libz.so.1')
+libz.inflateInit2_.argtypes = [ctypes.POINTER(ZStream), ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+libz.inflate.argtypes = [ctypes.POINTER(ZStream), ctypes.c_int]
+libz.inflateEnd.argtypes = [ctypes.POINTER(ZStream)]
+libz.inflateReset.argtypes = [ctypes.POINTER(ZStream)]
+libz.inflatePrime.argtypes = [ctypes.POINTER(ZStream), ctypes.c_int, ctypes.c_int]
+libz.inflateSetDictionary.argtypes = [ctypes.POINTER(ZStream), ctypes.c_char_p, ctypes.c_uint]
+
+class Inflater:
+	def __init__(self, wbits):
+		self.z = ZStream()
+		self.check(libz.inflateInit2_(self.z, wbits, zlib.ZLIB_RUNTIME_VERSION.encode(), ctypes.sizeof(ZStream)))
+		self.inbuf = ctypes.create_string_buffer(CHUNK)
+	def __del__(self):
+		if self.z.state: libz.inflateEnd(self.z)
+	def check(self, ret):
+		if ret < 0 or ret == Z_NEED_DICT:
+			raise zlib.error('inflate failed (%i): %s' % (ret, (self.z.msg or b'').decode()))
+		return ret
+	def feed(self, f):
+		# refill the input buffer if it is empty, returns False at EOF
+		if self.z.avail_in: return True
+		n = f.readinto(self.inbuf)
+		self.z.next_in = ctypes.addressof(self.inbuf)
+		self.z.avail_in = n
+		return n > 0
+	def inflate(self, out, offset, size, flush=Z_NO_FLUSH):
+		# inflate into out[offset:offset+size], returns (bytes written, zlib return code)
+		self.z.next_out = ctypes.addressof(out) + offset
+		self.z.avail_out = size
+		ret = self.check(libz.inflate(self.z, flush))
+		return size - self.z.avail_out, ret
+
+class AccessPoint:
+	def __init__(self, out, inp, bits, window):
+		self.out = out # uncompressed offset
+		self.inp = inp # compressed offset of the first full byte
+		self.bits = bits # number of bits of the preceding byte that belong to this point
+		self.window = window
+
+class GzipIndex:
+	MAGIC = b'GZIDX\x02'
+
+	def __init__(self, points=(), size=0, mtime=0):
+		self.points = list(points)
+		# compressed size and mtime (ns) of the file the index was built from
+		self.size = size
+		self.mtime = mtime
+
+	@classmethod
+	def build(cls, f, span=SPAN):
+		st = os.fstat(f.fileno())
+		index = cls(size=st.st_size, mtime=st.st_mtime_ns)
+		inf = Inflater(47) # gzip or zlib header
+		window = ctypes.create_string_buffer(WINSIZE)
+		pos = 0 # position in the circular window
+		totin = totout = 0
+		last = None
+		while True:
+			if not inf.feed(f): raise EOFError('unexpected end of gzip file')
+			before = inf.z.avail_in
+			n, ret = inf.inflate(window, pos, WINSIZE - pos, Z_BLOCK)
+			totin += before - inf.z.avail_in
+			totout += n
+			pos = (pos + n) % WINSIZE
+			if ret == Z_STREAM_END:
+				# there may be another gzip member after this one
+				if not inf.feed(f): break
+				libz.inflateReset(inf.z)
+				continue
+			# at the end of a deflate block that isn't the last one
+			if inf.z.data_type & 128 and not inf.z.data_type & 64 and (last is None or totout - last > span):
+				w = window.raw[pos:] + window.raw[:pos]
+				index.points.append(AccessPoint(totout, totin, inf.z.data_type & 7, w))
+				last = totout
+		return index
+
+	def matches(self, fn):
+		st = os.stat(fn)
+		return (self.size, self.mtime) == (st.st_size, st.st_mtime_ns)
+
+	def find(self, offset):
+		# last access point at or before offset
+		i = bisect.bisect_right(self.points, offset, key=lambda p: p.out)
+		return self.points[i-1] if i else None
+
+	def save(self, fn):
+		# write to a temporary file and rename it, so other processes never see a partial index
+		fd, tmp = tempfile.mkstemp(prefix=os.path.basename(fn) + '.', suffix='.tmp', dir=os.path.dirname(fn) or '.')
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(self.MAGIC + struct.pack('<QQI', self.size, self.mtime, len(self.points)))
+				for p in self.points:
+					w = zlib.compress(p.window)
+					f.write(struct.pack('<QQBI', p.out, p.inp, p.bits, len(w)) + w)
+			# mkstemp creates the file as 0600, use the normal permissions instead
+			umask = os.umask(0)
+			os.umask(umask)
+			os.chmod(tmp, 0o666 & ~umask)
+			os.replace(tmp, fn)
+		except BaseException:
+			os.unlink(tmp)
+			raise
+
+	@classmethod
+	def load(cls, fn):
+		with open(fn, 'rb') as f:
+			if f.read(len(cls.MAGIC)) != cls.MAGIC: raise ValueError('not a gzip index: ' + fn)
+			size, mtime, n = struct.unpack('<QQI', f.read(20))
+			index = cls(size=size, mtime=mtime)
+			for _ in range(n):
+				out, inp, bits, wlen = struct.unpack('<QQBI', f.read(21))
+				index.points.append(AccessPoint(out, inp, bits, zlib.decompress(f.read(wlen))))
+			return index
+
+class IndexedGzipFile(io.RawIOBase):
+	# seekable raw stream of the decompressed data, wrap it in io.BufferedReader
+	def __init__(self, fn, index):
+		self.f = open(fn, 'rb', buffering=0)
+		self.index = index
+		self.pos = 0
+		self.start(None)
+
+	def start(self, p):
+		if p is None:
+			self.f.seek(0)
+			self.inf = Inflater(47)
+			self.raw = False
+			self.pos = 0
+			return
+		self.f.seek(p.inp - (1 if p.bits else 0))
+		self.inf = Inflater(-15) # raw deflate
+		self.raw = True
+		if p.bits:
+			b = self.f.read(1)[0]
+			libz.inflatePrime(self.inf.z, p.bits, b >> (8 - p.bits))
+		self.inf.check(libz.inflateSetDictionary(self.inf.z, p.window, WINSIZE))
+		self.pos = p.out
+
+	def readable(self): return True
+	def seekable(self): return True
+	def tell(self): return self.pos
+
+	def readinto(self, b):
+		out = (ctypes.c_char * len(b)).from_buffer(b)
+		while True:
+			if not self.inf.feed(self.f): return 0
+			n, ret = self.inf.inflate(out, 0, len(b))
+			self.pos += n
+			if ret == Z_STREAM_END:
+				self.next_member()
+			if n: return n
+
+	def next_member(self):
+		# continue with the next gzip member, if any
+		# raw inflate stops before the gzip trailer, so skip it here
+		self.f.seek(self.f.tell() - self.inf.z.avail_in + (8 if self.raw else 0))
+		self.inf = Inflater(47)
+		self.raw = False
+
+	def seek(self, offset, whence=os.SEEK_SET):
+		if whence == os.SEEK_CUR: offset += self.pos
+		elif whence == os.SEEK_END: raise io.UnsupportedOperation('cannot seek from the end')
+		p = self.index.find(offset)
+		# restart from an access point, unless continuing from the current position is closer
+		if offset < self.pos or (p is not None and p.out > self.pos):
+			self.start(p)
+		skip = bytearray(CHUNK)
+		while self.pos < offset:
+			if not self.readinto(memoryview(skip)[:min(CHUNK, offset - self.pos)]): break
+		return self.pos
+
+	def close(self):
+		if not self.closed: self.f.close()
+		super().close()
+
+def open_indexed(fn, span=SPAN):
+	# load the index from fn.idx, or build and save it
+	ifn = fn + '.idx'
+	index = None
+	if os.path.exists(ifn):
+		try: index = GzipIndex.load(ifn)
+		except (ValueError, struct.error, zlib.error): pass # damaged or old format, rebuild it
+		# the file may have been replaced, even by one with an older mtime (cp -p, rsync -t)
+		if index is not None and not index.matches(fn): index = None
+	if index is None:
+		with open(fn, 'rb') as f: index = GzipIndex.build(f, span)
+		# without write access, just use the index for this run
+		try: index.save(ifn)
+		except OSError: pass
+	return io.BufferedReader(IndexedGzipFile(fn, index), 0x10000)
@@ -0,0 +1,55 @@
+import os
+import numpy as np
+
+from contacts import normalize
+
+SCALE = 1 # output pixels per heatmap pixel / antenna, viewers can scale up themselves
+
+def make_palette(n=256):
+	# same colors as DftPrinter.color
+	x = np.linspace(0, 1, n)
+	return np.stack([np.clip(np.round(x*500)-100, 0, 255), np.round(x*100), np.round((1-x)*100)], -1).astype(np.uint8)
+
+PALETTE = make_palette()
+
+def colorize(z, scale=SCALE):
+	# z: 0..1, (height, width) -> rgb (height*scale, width*scale, 3)
+	img = PALETTE[np.rint(z * (len(PALETTE)-1)).astype(np.intp)]
+	if scale == 1: return img
+	return img.repeat(scale, 0).repeat(scale, 1)
+
+def heatmap_image(data, height, width, z_min, z_max, scale=SCALE):
+	z = normalize(np.frombuffer(data, np.uint8).reshape(1, height, width), z_min, z_max)[0]
+	return colorize(z, scale)
+
+def magnitude_image(mags, width, height, scale=SCALE):
+	# x/y antenna magnitudes, combined into a 2D image with the same layout as the heatmap
+	m = np.log2(np.maximum(1, np.asarray(mags, np.float64))) / 32
+	return colorize(np.sqrt(m[None, :width] * m[width:width+height, None]), scale)
+
+class ImageWriter:
+	def __init__(self, path, raw=False):
+		# raw=False: one PPM per frame, raw=True: one rgb24 stream per image type and size
+		os.makedirs(path, exist_ok=True)
+		self.path = path
+		self.raw = raw
+		self.files = {}
+		self.counts = {}
+
+	def write(self, name, img):
+		h, w = img.shape[:2]
+		if self.raw:
+			fn = '%s-%ix%i.rgb' % (name, w, h)
+			f = self.files.get(fn)
+			if f is None: f = self.files[fn] = open(os.path.join(self.path, fn), 'wb')
+			f.write(img.tobytes())
+		else:
+			n = self.counts.get(name, 0)
+			self.counts[name] = n + 1
+			with open(os.path.join(self.path, '%s-%06i.ppm' % (name, n)), 'wb') as f:
+				f.write(b'P6\n%i %i\n255\n' % (w, h))
+				f.write(img.tobytes())
+
+	def close(self):
+		for f in self.files.values(): f.close()
+		self.files.clear()
@@ -0,0 +1,126 @@
+import sys, os, stat, time, socket, struct
+
+from surfacedata import *
+
+HID_TICK = 100e-6 # HID scan time unit
+START_TICK = 1e-6 # assumed unit of PacketStart.timestamp
+
+CONTAINER_IDS = (7, 8, 10, 11, 12, 13, 26, 28) # see HidReportInput
+
+def find_timestamp(buf, hid):
+	# returns (ticks, wraparound period, tick length) of the outermost timestamp
+	# buf is a HID report if hid, else an IPTS buffer. Only the fields on the way to the timestamp are read.
+	try:
+		o = 0
+		if not hid:
+			tp = IptsData.struct.unpack_from(buf)[0]
+			o = IptsData.fields_size
+			if tp == 0: return find_start_timestamp(buf, o)
+			if tp != 3: return None
+		if buf[o] in CONTAINER_IDS:
+			return HidReportContainer.struct.unpack_from(buf, o + HidReportInput.fields_size)[0], 1 << 16, HID_TICK
+	except (struct.error, IndexError): pass
+	return None
+
+def find_start_timestamp(buf, o):
+	# the first PacketStart in an IptsPayload
+	frames = IptsPayload.struct.unpack_from(buf, o)[1]
+	o += IptsPayload.fields_size
+	for _ in range(frames):
+		_, tp, size, *_ = IptsFrame.struct.unpack_from(buf, o)
+		o += IptsFrame.fields_size
+		if tp in (6, 7, 8):
+			p = o
+			while p < o + size:
+				ptype, _, psize = Packet.struct.unpack_from(buf, p)
+				p += Packet.fields_size
+				if ptype == 0: return PacketStart.struct.unpack_from(buf, p)[-1], 1 << 32, START_TICK
+				p += psize
+		o += size
+	return None
+
+def open_replay_output(fn):
+	if os.path.exists(fn) and stat.S_ISSOCK(os.stat(fn).st_mode):
+		try:
+			s = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+			s.connect(fn)
+		except OSError:
+			s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			s.connect(fn)
+		return s, s.sendall
+	# unbuffered, so each buffer is a single write to a FIFO
+	f = open(fn, 'wb', buffering=0)
+	return f, f.write
+
+class ReplayStats:
+	def __init__(self):
+		self.count = 0
+		self.bytes = 0
+		self.capture_time = 0.
+		self.late_sum = 0.
+		self.late_max = 0.
+
+	def add(self, o):
+		self.count += o.count
+		self.bytes += o.bytes
+		self.capture_time += o.capture_time
+		self.late_sum += o.late_sum
+		self.late_max = max(self.late_max, o.late_max)
+
+	def print(self, name, t, speed):
+		s = '%-6s%10.1f buffers/s %8.3f MB/s' % (name, self.count / t, self.bytes / t / 1e6)
+		if speed:
+			s += ' %7.2fx late avg %8.3f ms max %8.3f ms' % (self.capture_time / t, self.late_sum / max(1, self.count) * 1e3, self.late_max * 1e3)
+		print(s, file=sys.stderr)
+
+class Replayer:
+	def __init__(self, write, speed, hid=False):
+		self.write = write
+		self.speed = speed # 0 = as fast as possible
+		self.hid = hid # HID reports instead of IPTS buffers
+		self.last = None
+		self.capture_time = 0.
+		self.start = self.report_time = time.perf_counter()
+		self.stats = ReplayStats()
+		self.total = ReplayStats()
+
+	def add(self, buf):
+		if self.speed:
+			t = find_timestamp(buf, self.hid)
+			if t:
+				ts, wrap, tick = t
+				if self.last is not None and self.last[1:] == t[1:]:
+					dt = ((ts - self.last[0]) % wrap) * tick
+					self.capture_time += dt
+					self.stats.capture_time += dt
+				self.last = t
+			# the target is absolute, so oversleeping doesn't accumulate as drift
+			target = self.start + self.capture_time / self.speed
+			self.wait(target)
+		self.write(buf)
+		now = time.perf_counter()
+		if self.speed:
+			late = max(0., now - target)
+			self.stats.late_sum += late
+			self.stats.late_max = max(self.stats.late_max, late)
+		self.stats.count += 1
+		self.stats.bytes += len(buf)
+		if now - self.report_time >= 1: self.report(now)
+
+	def wait(self, target):
+		while True:
+			d = target - time.perf_counter()
+			if d <= 0: return
+			# sleep() is too coarse, spin for the last millisecond
+			if d > .002: time.sleep(d - .001)
+
+	def report(self, now):
+		self.stats.print('', now - self.report_time, self.speed)
+		self.total.add(self.stats)
+		self.stats = ReplayStats()
+		self.report_time = now
+
+	def finish(self):
+		now = time.perf_counter()
+		self.total.add(self.stats)
+		self.total.print('total', now - self.start, self.speed)
@@ -0,0 +1,75 @@
+# parse jobs sent by surface-parser-client.py, each in a forked child of an already warmed-up process
+
+import sys, os, stat, struct, socket, signal, select, threading, traceback, gc
+
+def serve(path, main):
+	# import everything a job might need up front, so the children don't have to
+	import gzip, replay
+	try: import gzindex
+	except OSError: pass
+	try: import contacts, transform, render
+	except ImportError: pass
+	signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+	if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode): os.unlink(path)
+	s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	s.bind(path)
+	s.listen(64)
+	# keep the garbage collector from touching (and copying) the parent's objects in the children
+	gc.freeze()
+	while True:
+		conn, _ = s.accept()
+		if os.fork() == 0:
+			s.close()
+			os._exit(run_job(conn, main))
+		conn.close()
+
+def run_job(conn, main):
+	# request: cwd and args separated by NUL, with the client's stdout/stderr attached
+	# response: exit status
+	msg, fds, _, _ = socket.recv_fds(conn, 0x10000, 2)
+	while True:
+		d = conn.recv(0x10000)
+		if not d: break
+		msg += d
+	cwd, *args = (os.fsdecode(x) for x in msg.split(b'\0'))
+	os.dup2(fds[0], 1)
+	os.dup2(fds[1], 2)
+	for fd in fds: os.close(fd)
+	hangup = threading.Event()
+	threading.Thread(target=watch_client, args=(conn, hangup), daemon=True).start()
+	status = 0
+	try:
+		os.chdir(cwd)
+		main(args)
+	except KeyboardInterrupt:
+		if not hangup.is_set(): traceback.print_exc()
+		status = 130
+	except SystemExit as e:
+		# same as the interpreter: sys.exit() is success, sys.exit('msg') prints msg and fails
+		if e.code is None: status = 0
+		elif isinstance(e.code, int): status = e.code
+		else:
+			print(e.code, file=sys.stderr)
+			status = 1
+	except BaseException:
+		traceback.print_exc()
+		status = 1
+	# the job is done, the client closing the connection must not interrupt the rest
+	signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGINT})
+	try:
+		sys.stdout.flush()
+		sys.stderr.flush()
+	except OSError:
+		pass
+	try: conn.sendall(struct.pack('<i', status))
+	except OSError: pass # client is gone
+	return status
+
+def watch_client(conn, hangup):
+	# the connection is closed when the client exits or is killed, stop the job then
+	# a real signal (unlike _thread.interrupt_main) also interrupts blocking reads, e.g. from hidraw
+	p = select.poll()
+	p.register(conn, select.POLLHUP)
+	p.poll() # only returns on POLLHUP/POLLERR, the client has shut down its side for writing
+	hangup.set()
+	signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
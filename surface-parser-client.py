@@ -0,0 +1,31 @@
+#!/usr/bin/python3 -S
+
+# thin client for `surface-parser.py --server=<socket>`
+# -S and _socket instead of socket keep the interpreter startup short
+
+import sys, os, _socket
+
+def main(path, args):
+	s = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+	s.connect(path)
+	msg = b'\0'.join(os.fsencode(x) for x in [os.getcwd()] + args)
+	# pass our stdout/stderr to the server, it writes the output directly
+	fds = b''.join(fd.to_bytes(4, sys.byteorder) for fd in (sys.stdout.fileno(), sys.stderr.fileno()))
+	n = s.sendmsg([msg], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, fds)])
+	s.sendall(msg[n:])
+	s.shutdown(_socket.SHUT_WR)
+	d = b''
+	while len(d) < 4:
+		x = s.recv(4 - len(d))
+		if not x: return 1
+		d += x
+	return int.from_bytes(d, 'little', signed=True)
+
+if __name__ == '__main__':
+	if len(sys.argv) < 2:
+		sys.exit('usage: %s <socket> [surface-parser args...]' % sys.argv[0])
+	try:
+		sys.exit(main(sys.argv[1], sys.argv[2:]))
+	except KeyboardInterrupt:
+		# exiting closes the connection, which stops the job
+		sys.exit(130)
@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 
-import sys, math, os, stat, gzip, struct, io
+import sys, math, os, stat, struct, io, time
 
 from surfacedata import *
 
@@ -82,13 +82,26 @@ def get_pos(r):
 	d = (x0 - x2) / (2 * (x0 - 2*x1 + x2))
 	return r.first + maxi + max(mind, min(maxd, d))
 
+DFT_LEVELS = 16
+DFT_REFRESH = 60 # Hz, for live output
+
 class DftInfo: pass
 class DftPrinter:
-	def __init__(self):
+	def __init__(self, out=None, live=False, mm=False, transform=None):
 		self.dfts = []
 		self.info = []
 		self.counter = 0
 		self.last_ts = 0
+		self.mm = mm
+		self.transform = transform
+		self.out = out or sys.stdout
+		self.live = live
+		self.next_draw = 0
+		self.pending = None # (dfts, ts, dt) of the newest group not drawn yet
+		self.drawn = False
+		# escape sequence + glyph for each magnitude level
+		self.level_text = [self.color(l / DFT_LEVELS) + '0123456789ABCDEF'[l] for l in range(DFT_LEVELS)]
+		self.axis_cache = {}
 
 	def add(self, o):
 		if isinstance(o, list):
@@ -107,10 +120,30 @@ class DftPrinter:
 		if x is None: return "\033[0m"
 		return "\033[48;2;%i;%i;%im" % (max(0,min(255,round(x*500)-100)), round(x*100), round((1-x)*100))
 
-	def get_row_text(self, r):
-		m = math.log2(max(1,r.magnitude)) / 32
-		yield self.color(m)
-		yield '0123456789ABCDEF'[round(m * 16)]
+	def get_level(self, r):
+		# round(log2(magnitude) / 2), i.e. log2(magnitude) / 32 quantized to 16 levels
+		m = r.magnitude
+		b = m.bit_length()
+		l = b >> 1
+		# 2^1, 2^3, 2^5, ... are exactly halfway, round() rounds those to even
+		if l & 1 and not b & 1 and not m & (m - 1): l -= 1
+		return min(DFT_LEVELS - 1, l)
+
+	def get_axis_text(self, rows):
+		levels = tuple(self.get_level(r) for r in rows)
+		s = self.axis_cache.get(levels)
+		if s is None:
+			# only emit a color escape when the level changes
+			t = []
+			prev = None
+			for l in levels:
+				t.append(self.level_text[l] if l != prev else self.level_text[l][-1])
+				prev = l
+			t.append(self.color(None))
+			s = ''.join(t)
+			if len(self.axis_cache) >= 0x10000: self.axis_cache.clear()
+			self.axis_cache[levels] = s
+		return s
 
 	def get_bits(self, dft, start, end):
 		if dft is None: return None
@@ -132,11 +165,9 @@ class DftPrinter:
 		else:
 			assert i.num_rows == d.num_rows
 			yield 'x'
-			for r in d.x: yield from self.get_row_text(r)
-			yield self.color(None)
+			yield self.get_axis_text(d.x)
 			yield 'y'
-			for r in d.y: yield from self.get_row_text(r)
-			yield self.color(None)
+			yield self.get_axis_text(d.y)
 		if i.data_type == 6:
 			if d is None:
 				x0 = y0 = x1 = y1 = NAN
@@ -145,8 +176,14 @@ class DftPrinter:
 				y0 = get_pos(d.y[0])
 				x1 = get_pos(d.x[1])
 				y1 = get_pos(d.y[1])
-			for x in (x0, y0, x1-x0, y1-y0):
-				yield '%5i' % (x*100) if not math.isnan(x) else '     '
+			if self.mm:
+				x0, y0 = point_to_mm(self.transform, x0, y0)
+				x1, y1 = point_to_mm(self.transform, x1, y1)
+				for x in (x0, y0, x1-x0, y1-y0):
+					yield '%7.1f' % x if not math.isnan(x) else '       '
+			else:
+				for x in (x0, y0, x1-x0, y1-y0):
+					yield '%5i' % (x*100) if not math.isnan(x) else '     '
 		if i.data_type == 10:
 			b = self.get_bits(d, 0, i.num_rows)
 			yield '   ' if b is None else '=%02x' % b
@@ -159,10 +196,45 @@ class DftPrinter:
 		ts = min(x.timestamp for x in self.dfts)
 		dt = (ts - self.last_ts) & 0xffffffff
 		self.last_ts = ts
-		self.dfts.sort(key=lambda x: x.data_type)
+		if self.live:
+			# groups that would be overdrawn before the next screen refresh aren't formatted,
+			# only the newest one is kept until the next tick
+			self.pending = self.dfts, ts, dt
+			self.dfts = []
+			self.tick()
+		else:
+			self.out.write(self.get_line(self.dfts, ts, dt) + '\n')
+
+	def tick(self):
+		if self.pending is None: return
+		now = time.perf_counter()
+		if now < self.next_draw: return
+		self.next_draw = now + 1 / DFT_REFRESH
+		self.draw()
+
+	def draw(self):
+		if not self.drawn:
+			# lines are often wider than the terminal, without autowrap \r still goes back to the start of the line
+			self.out.write('\033[?7l')
+			self.drawn = True
+		self.out.write('\r' + self.get_line(*self.pending) + '\033[K')
+		self.out.flush()
+		self.pending = None
+
+	def finish(self):
+		# print the last group, and restore the terminal in live mode
+		self.print()
+		if self.pending is not None: self.draw()
+		if self.drawn:
+			self.out.write('\033[?7h\n')
+			self.out.flush()
+			self.drawn = False
+
+	def get_line(self, dfts, ts, dt):
+		dfts.sort(key=lambda x: x.data_type)
 		i = 0
 		line = []
-		for x in self.dfts:
+		for x in dfts:
 			while i < len(self.info) and self.info[i].data_type < x.data_type:
 				line.extend(self.get_dft_text(self.info[i], None))
 				i += 1
@@ -176,93 +248,512 @@ class DftPrinter:
 				if x.num_rows > info.num_rows: info.num_rows = x.num_rows
 			line.extend(self.get_dft_text(info, x))
 			i += 1
-		print('%10i%+11i' % (ts,dt) + ''.join(line))
+		return '%10i%+11i' % (ts,dt) + ''.join(line)
+
+
+# timestamps
+
+class Clock:
+	# HID container timestamps (100us) take precedence over PacketStart timestamps (legacy IPTS data)
+	def __init__(self):
+		self.timestamp = 0
+		self.hid = False
+
+	def add(self, o):
+		if isinstance(o, HidReportContainer):
+			self.hid = True
+			self.timestamp = o.timestamp
+		elif not self.hid:
+			self.timestamp = o.timestamp
+
+
+# heatmap contacts
+
+class ContactPrinter:
+	BATCH = 4096
+
+	def __init__(self, mm=False, transform=None):
+		self.dims = None
+		self.clock = Clock()
+		self.frame = 0
+		self.shape = None
+		self.frames = []
+		self.mm = mm
+		self.transform = transform
+		self.info = [] # (frame number, timestamp, z_min, z_max)
+
+	def add(self, o):
+		if isinstance(o, list):
+			for x in o: self.add(x)
+		elif isinstance(o, HidReportContainer):
+			self.clock.add(o)
+			self.add(o.data)
+		elif isinstance(o, PacketStart):
+			self.clock.add(o)
+		elif isinstance(o, PacketHeatmapDimensions):
+			self.dims = o
+		elif isinstance(o, HeatmapData):
+			self.add_frame(o)
+		elif hasattr(o, 'data'):
+			self.add(o.data)
+
+	def add_frame(self, data):
+		d = self.dims
+		if d is None or len(data) != d.width * d.height: return
+		if self.shape != (d.height, d.width):
+			self.print()
+			self.shape = (d.height, d.width)
+		self.frames.append(data)
+		self.info.append((self.frame, self.clock.timestamp, d.z_min, d.z_max))
+		self.frame += 1
+		if len(self.frames) >= self.BATCH: self.print()
+
+	def print(self):
+		if not self.frames: return
+		import numpy as np
+		from contacts import find_contacts
+		frames = np.frombuffer(b''.join(self.frames), np.uint8).reshape(len(self.frames), *self.shape)
+		info = np.array(self.info)
+		frame, x, y, size, peak = find_contacts(frames, info[:,2], info[:,3])
+		if self.mm: x, y = grid_to_mm(self.transform, x, y)
+		for i, fx, fy, n, p in zip(frame, x, y, size, peak):
+			print('%8i %10i %7.2f %7.2f %4i %5.3f' % (info[i,0], info[i,1], fx, fy, n, p))
+		self.frames.clear()
+		self.info.clear()
+
+
+# image output
+
+class FrameRenderer:
+	def __init__(self, writer, scale=1):
+		import render
+		self.render = render
+		self.writer = writer
+		self.scale = scale
+		self.dims = None
+
+	def add(self, o):
+		if isinstance(o, list):
+			for x in o: self.add(x)
+		elif isinstance(o, PacketHeatmapDimensions):
+			self.dims = o
+		elif isinstance(o, HeatmapData):
+			d = self.dims
+			if d is None or len(o) != d.width * d.height: return
+			self.writer.write('heatmap', self.render.heatmap_image(o, d.height, d.width, d.z_min, d.z_max, self.scale))
+		elif isinstance(o, PacketPenMagnitude):
+			# the antenna counts match the heatmap size
+			d = self.dims
+			if d is None or len(o.data) != d.width + d.height: return
+			self.writer.write('magnitude', self.render.magnitude_image(o.data, d.width, d.height, self.scale))
+		elif hasattr(o, 'data'):
+			self.add(o.data)
+
+
+# stylus samples
+
+class StylusPrinter:
+	BATCH = 4096
+
+	def __init__(self, mm=False, transform=None):
+		self.clock = Clock()
+		self.samples = []
+		self.mm = mm
+		self.transform = transform
+
+	def add(self, o):
+		if isinstance(o, list):
+			for x in o: self.add(x)
+		elif isinstance(o, HidReportContainer):
+			self.clock.add(o)
+			self.add(o.data)
+		elif isinstance(o, PacketStart):
+			self.clock.add(o)
+		elif isinstance(o, StylusDataSimple):
+			self.add_sample(o.x, o.y, o.pressure, 0, 0)
+		elif isinstance(o, StylusDataTilt):
+			self.add_sample(o.x, o.y, o.pressure, o.altitude, o.azimuth)
+		elif hasattr(o, 'data'):
+			self.add(o.data)
+
+	def add_sample(self, *sample):
+		self.samples.append((self.clock.timestamp,) + sample)
+		if len(self.samples) >= self.BATCH: self.print()
+
+	def print(self):
+		if not self.samples: return
+		ts, x, y, p, alt, azi = zip(*self.samples)
+		if self.mm:
+			x, y = stylus_to_mm(self.transform, x, y)
+			for s in zip(ts, x, y, p, alt, azi):
+				print('%10i %7.2f %7.2f %5i %5i %5i' % s)
+		else:
+			for s in self.samples:
+				print('%10i %7i %7i %5i %5i %5i' % s)
+		self.samples.clear()
+
+
+# pen strokes
+
+class Stroke:
+	MAX_GAPS = 16
+
+	def __init__(self):
+		self.start_ts = self.end_ts = None
+		self.groups = 0
+		self.last_group = None
+		self.dropped = 0
+		self.gaps = []
+		self.dfts = 0
+		self.samples = 0
+		self.contact_samples = 0
+		self.pressure = self.altitude = self.azimuth = None
+		self.flags = 0
+
+	def add_group(self, counter):
+		if counter == self.last_group: return
+		if self.last_group is not None and counter != self.last_group + 1:
+			self.dropped += (counter - self.last_group - 1) & 0xffffffff
+			if len(self.gaps) <= self.MAX_GAPS: self.gaps.append((self.last_group + 1, counter - 1))
+		self.groups += 1
+		self.last_group = counter
+
+	def add_dft(self, ts):
+		if self.start_ts is None: self.start_ts = ts
+		self.end_ts = ts
+		self.dfts += 1
+
+	def add_sample(self, pressure, altitude=None, azimuth=None):
+		self.samples += 1
+		if pressure: self.contact_samples += 1
+		self.pressure = extend_range(self.pressure, pressure)
+		if altitude is not None:
+			self.altitude = extend_range(self.altitude, altitude)
+			self.azimuth = extend_range(self.azimuth, azimuth)
+
+	def get_text(self):
+		def r(x): return '    -      ' if x is None else '%5i-%-5i' % x
+		gaps = ','.join(str(a) if a == b else '%i-%i' % (a, b) for a, b in self.gaps[:self.MAX_GAPS])
+		if len(self.gaps) > self.MAX_GAPS: gaps += ',...'
+		start = self.start_ts or 0
+		end = self.end_ts or 0
+		return '%10i %10i %+11i %6i %6i %6i %6i %s %s %s 0x%02x %6i %s' % (
+			start, end, (end - start) & 0xffffffff, self.groups, self.dfts, self.samples, self.contact_samples,
+			r(self.pressure), r(self.altitude), r(self.azimuth), self.flags, self.dropped, gaps)
+
+def extend_range(r, x):
+	if r is None: return x, x
+	return min(r[0], x), max(r[1], x)
+
+class StrokePrinter:
+	# only the current stroke is kept, so this runs in constant memory
+	def __init__(self):
+		self.stroke = None
+		self.started = False # seen a detection or lift
+		self.outside = 0 # pen packets between a lift and the next detection
+
+	def get_stroke(self):
+		# before the first detection/lift, the capture may have started in the middle of a stroke
+		if self.stroke is None and not self.started: self.stroke = Stroke()
+		if self.stroke is None: self.outside += 1
+		return self.stroke
+
+	def add(self, o):
+		if isinstance(o, list):
+			for x in o: self.add(x)
+		elif isinstance(o, PacketPenDetection):
+			self.print()
+			self.started = True
+			self.stroke = Stroke()
+		elif isinstance(o, PacketPenLift):
+			self.print()
+			self.started = True
+		elif isinstance(o, PacketPenMetadata):
+			s = self.get_stroke()
+			if s: s.add_group(o.group_counter)
+		elif isinstance(o, PacketPenDftWindow):
+			s = self.get_stroke()
+			if s: s.add_dft(o.timestamp)
+		elif isinstance(o, PacketPenMagnitude):
+			s = self.get_stroke()
+			if s: s.flags |= o.flags
+		elif isinstance(o, StylusDataTilt):
+			s = self.get_stroke()
+			if s: s.add_sample(o.pressure, o.altitude, o.azimuth)
+		elif isinstance(o, StylusDataSimple):
+			s = self.get_stroke()
+			if s: s.add_sample(o.pressure)
+		elif hasattr(o, 'data'):
+			self.add(o.data)
+
+	def print(self):
+		if self.stroke is None: return
+		print(self.stroke.get_text())
+		self.stroke = None
+
+	def finish(self):
+		self.print()
+		if self.outside: print('%i pen packets outside of strokes' % self.outside, file=sys.stderr)
+
+
+# physical units
+
+def find_metadata(o):
+	if isinstance(o, Metadata): return o
+	if isinstance(o, list):
+		for x in o:
+			# metadata is sent in containers, never inside packet lists
+			if isinstance(x, Packet): break
+			m = find_metadata(x)
+			if m: return m
+	elif hasattr(o, 'data'):
+		return find_metadata(o.data)
+	return None
+
+def grid_to_mm(transform, col, row):
+	if transform is None: return unknown_mm(col)
+	return transform.grid_to_mm(col, row)
+
+def point_to_mm(transform, col, row):
+	# grid_to_mm for a single position
+	if transform is None: return NAN, NAN
+	return transform.point_to_mm(col, row)
+
+def stylus_to_mm(transform, x, y):
+	if transform is None: return unknown_mm(x)
+	return transform.stylus_to_mm(x, y)
+
+def unknown_mm(v):
+	# no metadata seen yet
+	v = [NAN] * len(v)
+	return v, v
 
 
 # file formats
 
 FmtIthc, FmtIptsBin, FmtIptsTxt, FmtIptsHid, FmtHidRaw = range(5)
 
-def read_buffers(f, fmt):
+def read_txt_buffers(f, start=0, end=None):
+	# yields the raw IPTS buffers of an ipts-dbg text dump
+	data = None
+	if start: f.seek(start)
+	for line in f:
+		if line.startswith(b'='):
+			l = line.index(b'Buffer:') + 7
+			r = line.index(b'=', l)
+			bufnum = int(line[l:r])
+			l = line.index(b'Type:') + 5
+			r = line.index(b'=', l)
+			tp = int(line[l:r])
+			l = line.index(b'Size:') + 5
+			r = line.index(b'=', l)
+			sz = int(line[l:r])
+			data = []
+			if end is not None and f.tell() - len(line) >= end: break
+		elif data is not None:
+			data.extend(int(x, 16) for x in line.split())
+			if len(data) >= sz:
+				yield struct.pack('<III52x', tp, sz, bufnum) + bytes(data)
+				data = None
+
+def read_buffers(f, fmt, start=0, end=None):
+	# start/end: offset of the first record, and offset at which no more records are started
 	if fmt == FmtIptsTxt:
-		data = None
-		for line in f:
-			if line.startswith(b'='):
-				l = line.index(b'Buffer:') + 7
-				r = line.index(b'=', l)
-				bufnum = int(line[l:r])
-				l = line.index(b'Type:') + 5
-				r = line.index(b'=', l)
-				tp = int(line[l:r])
-				l = line.index(b'Size:') + 5
-				r = line.index(b'=', l)
-				sz = int(line[l:r])
-				data = []
-			elif data is not None:
-				data.extend(int(x, 16) for x in line.split())
-				if len(data) >= sz:
-					buf = struct.pack('<III52x', tp, sz, bufnum) + bytes(data)
-					with Block(io.BytesIO(buf), len(buf)) as b:
-						x = IptsData()
-						x.read(b)
-						yield x
-					data = None
+		for buf in read_txt_buffers(f, start, end):
+			with Block(io.BytesIO(buf), len(buf)) as b:
+				x = IptsData()
+				x.read(b)
+				yield x
 		return
 	if fmt == FmtIptsHid:
 		iptshdr = IptsDumpHidHeader()
 		iptshdr.read(f)
 		yield iptshdr
+	if start: f.seek(start)
 	while True:
 		start = f.tell()
+		if end is not None and start >= end: break
 		try:
 			if fmt == FmtIthc:
 				x = IthcApi()
 				x.read(f)
-				yield x.data
+				x = x.data
 			elif fmt == FmtIptsBin:
 				x = IptsData()
 				x.read(f)
-				yield x
 			elif fmt == FmtIptsHid:
 				x = IptsDumpHidData()
 				x.read(f, iptshdr.buffer_size)
-				yield x.data
+				x = x.data
 			elif fmt == FmtHidRaw:
 				buf = f.read1()
 				with Block(io.BytesIO(buf), len(buf)) as b:
 					x = HidReportInput()
 					x.read(b)
-					yield x
 		except EOFError:
 			if f.tell() == start: break
 			raise
+		yield x
+
+def read_exact(f, n):
+	d = f.read(n)
+	if len(d) < n: raise EOFError()
+	return d
+
+def read_raw_buffers(f, fmt, start=0, end=None):
+	# like read_buffers, but only reads the record headers and yields the undecoded IPTS buffers
+	# (HID reports for --iptshid/--hidraw)
+	if fmt == FmtIptsTxt:
+		yield from read_txt_buffers(f, start, end)
+		return
+	if fmt == FmtIptsHid:
+		iptshdr = IptsDumpHidHeader()
+		iptshdr.read(f)
+	if start: f.seek(start)
+	while True:
+		start = f.tell()
+		if end is not None and start >= end: break
+		try:
+			if fmt == FmtIthc:
+				hdr = read_exact(f, IthcApi.fields_size)
+				hdr_size, *_, size = IthcApi.struct.unpack(hdr)
+				read_exact(f, hdr_size - len(hdr))
+				buf = read_exact(f, size)
+			elif fmt == FmtIptsBin:
+				hdr = read_exact(f, IptsData.fields_size)
+				_, size, *_ = IptsData.struct.unpack(hdr)
+				buf = hdr + read_exact(f, size)
+			elif fmt == FmtIptsHid:
+				size, = IptsDumpHidData.struct.unpack(read_exact(f, IptsDumpHidData.fields_size))
+				buf = read_exact(f, iptshdr.buffer_size)[:size]
+			elif fmt == FmtHidRaw:
+				buf = f.read1()
+				if not buf: break
+		except EOFError:
+			if f.tell() == start: break
+			raise
+		yield buf
 
 
 def main(args):
 	dft = False
+	contacts = False
+	stylus = False
+	strokes = False
+	mm = False
 	fmt = None
+	replay = None
+	speed = 1.
+	render = None
+	rawvideo = False
+	scale = 1
+	live = False
+	start = 0
+	end = None
+	gzindex = False
+	server = None
 	for a in args:
 		if not a.startswith('-'): continue
 		if a == '--dft': dft = True
+		elif a == '--live': live = True
+		elif a == '--contacts': contacts = True
+		elif a == '--stylus': stylus = True
+		elif a == '--strokes': strokes = True
+		elif a == '--mm': mm = True
 		elif a == '--ithc': fmt = FmtIthc
 		elif a == '--iptsbin': fmt = FmtIptsBin
 		elif a == '--iptstxt': fmt = FmtIptsTxt
 		elif a == '--iptshid': fmt = FmtIptsHid
 		elif a == '--hidraw': fmt = FmtHidRaw
+		elif a.startswith('--replay='): replay = a[9:]
+		elif a.startswith('--speed='): speed = float(a[8:])
+		elif a.startswith('--render='): render = a[9:]
+		elif a == '--rawvideo': rawvideo = True
+		elif a.startswith('--scale='): scale = int(a[8:])
+		elif a.startswith('--range='):
+			start, _, end = a[8:].partition(':')
+			start = int(start, 0) if start else 0
+			end = int(end, 0) if end else None
+		elif a == '--gzindex': gzindex = True
+		elif a.startswith('--server='): server = a[9:]
 		else: raise Exception(a)
-	if fmt is None:
+	if server is not None:
+		from server import serve
+		serve(server, main)
+		return
+	if fmt is None and not gzindex:
 		raise Exception('No format specified')
+	if replay is not None:
+		from replay import open_replay_output, Replayer
+		replay_out, write = open_replay_output(replay)
+	transform = None
+	out = sys.stdout
+	if dft and not (fmt == FmtHidRaw and not live):
+		# large buffer, DFT lines are long and there are a lot of them
+		out = open(sys.stdout.fileno(), 'w', buffering=1 << 20, closefd=False)
+	if render is not None:
+		from render import ImageWriter
+		writer = ImageWriter(render, rawvideo)
 	for fn in args:
 		if fn.startswith('-'): continue
-		if fn.endswith('.gz'): f = gzip.open(fn, 'rb')
+		if gzindex:
+			from gzindex import open_indexed
+			open_indexed(fn).close()
+			continue
+		if fn.endswith('.gz') and (start or end is not None):
+			from gzindex import open_indexed
+			f = open_indexed(fn)
+		elif fn.endswith('.gz'):
+			import gzip
+			f = gzip.open(fn, 'rb')
 		else: f = open(fn, 'rb', buffering=0x10000)
 		with f:
-			dftprinter = DftPrinter()
-			for x in read_buffers(f, fmt):
-				if dft:
-					dftprinter.add(x)
-				else:
-					print_struct(None, x, 0)
+			if replay is not None:
+				replayer = Replayer(write, speed, fmt in (FmtIptsHid, FmtHidRaw))
+				for buf in read_raw_buffers(f, fmt, start, end):
+					replayer.add(buf)
+				replayer.finish()
+				continue
+			dftprinter = DftPrinter(out, live, mm, transform)
+			contactprinter = ContactPrinter(mm, transform)
+			stylusprinter = StylusPrinter(mm, transform)
+			strokeprinter = StrokePrinter()
+			renderer = FrameRenderer(writer, scale) if render is not None else None
+			printers = (dftprinter, contactprinter, stylusprinter)
+			try:
+				for x in read_buffers(f, fmt, start, end):
+					meta = find_metadata(x) if mm else None
+					if meta:
+						# finish batches that were collected with the old transform
+						contactprinter.print()
+						stylusprinter.print()
+						from transform import CoordTransform
+						transform = CoordTransform(meta)
+						for p in printers: p.transform = transform
+					if dft:
+						dftprinter.add(x)
+						if live: dftprinter.tick()
+					elif contacts:
+						contactprinter.add(x)
+					elif stylus:
+						stylusprinter.add(x)
+					elif strokes:
+						strokeprinter.add(x)
+					elif renderer:
+						renderer.add(x)
+					else:
+						print_struct(None, x, 0)
+			finally:
+				# also restores the terminal after ctrl-c in live mode
+				dftprinter.finish()
+			contactprinter.print()
+			stylusprinter.print()
+			strokeprinter.finish()
+	if replay is not None:
+		replay_out.close()
+	if render is not None:
+		writer.close()
+	out.flush()
 
 if __name__ == '__main__':
 	main(sys.argv[1:])
@@ -0,0 +1,29 @@
+import numpy as np
+
+# stylus coordinates are normalized to this range, regardless of the screen size
+STYLUS_MAX_X = 9600
+STYLUS_MAX_Y = 7200
+
+class CoordTransform:
+	def __init__(self, meta):
+		# meta.xx etc. map col/row (heatmap pixels or pen antennas) to physical screen coords in mm
+		self.grid = np.array([
+			[meta.xx, meta.yx, meta.tx],
+			[meta.xy, meta.yy, meta.ty],
+		], np.float64)
+		# the same as plain floats, numpy's per-call overhead dominates for single points
+		self.grid_coefs = tuple(self.grid.ravel().tolist())
+		# screen_width/height are mm*100
+		self.stylus = np.array([meta.screen_width / 100 / STYLUS_MAX_X, meta.screen_height / 100 / STYLUS_MAX_Y])
+
+	def grid_to_mm(self, col, row):
+		p = np.stack(np.broadcast_arrays(np.asarray(col, np.float64), np.asarray(row, np.float64), 1.))
+		x, y = np.tensordot(self.grid, p, 1)
+		return x, y
+
+	def point_to_mm(self, col, row):
+		xx, yx, tx, xy, yy, ty = self.grid_coefs
+		return xx*col + yx*row + tx, xy*col + yy*row + ty
+
+	def stylus_to_mm(self, x, y):
+		return np.asarray(x) * self.stylus[0], np.asarray(y) * self.stylus[1]